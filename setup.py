@@ -14,6 +14,7 @@ setup(
     url='https://github.com/yutatech/argcompgen',
     packages=find_packages(where='src'),
     package_dir={'': 'src'},
+    package_data={'argcompgen': ['share/*']},
     entry_points={
         'console_scripts': [
             'argcompgen=argcompgen.main:main',
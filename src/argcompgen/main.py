@@ -1,31 +1,429 @@
 #!/usr/bin/env python3
 
 import argparse
+import ast
+import collections
+import contextlib
+import functools
+import hashlib
+import importlib.util
+import io
+import json
 import os
+import re
+import shlex
+import shutil
 import sys
+import sysconfig
 import runpy
-from textwrap import indent
+import threading
 
-captured_parser = None
+SHARE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "share")
+
+
+def _is_argument_parser_call(node) -> bool:
+    if not isinstance(node, ast.Call):
+        return False
+    func = node.func
+    return (isinstance(func, ast.Attribute) and func.attr == "ArgumentParser") or (
+        isinstance(func, ast.Name) and func.id == "ArgumentParser"
+    )
+
+
+def _returns_argument_parser(func: ast.FunctionDef) -> bool:
+    """ArgumentParser を生成して return する関数かどうかを判定する"""
+    parser_names = set()
+    for node in ast.walk(func):
+        if isinstance(node, ast.Assign) and _is_argument_parser_call(node.value):
+            parser_names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+    for node in ast.walk(func):
+        if isinstance(node, ast.Return) and node.value is not None:
+            if _is_argument_parser_call(node.value):
+                return True
+            if isinstance(node.value, ast.Name) and node.value.id in parser_names:
+                return True
+    return False
+
+
+def _takes_no_required_args(func: ast.FunctionDef) -> bool:
+    args = func.args
+    positional = getattr(args, "posonlyargs", []) + args.args
+    return len(positional) == len(args.defaults) and None not in args.kw_defaults
+
+
+def _is_literal_assign(node) -> bool:
+    if not isinstance(node, ast.Assign):
+        return False
+    if not all(isinstance(t, ast.Name) for t in node.targets):
+        return False
+    try:
+        ast.literal_eval(node.value)
+    except ValueError:
+        return False
+    return True
+
+
+def _argparse_import(node):
+    """argparse の import だけを取り出す (`import argparse, os` なら argparse のみ)"""
+    if isinstance(node, ast.Import):
+        names = [alias for alias in node.names if alias.name == "argparse"]
+        if names:
+            return ast.copy_location(ast.Import(names=names), node)
+    elif isinstance(node, ast.ImportFrom) and node.module == "argparse":
+        return node
+    return None
+
+
+_PARSE_METHODS = ("parse_args", "parse_intermixed_args")
+
+
+def _is_call_to(node, name: str) -> bool:
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id == name
+        and not node.args
+        and not node.keywords
+    )
+
+
+def _name_uses(scope, name: str):
+    """scope 内で変数 name を読む箇所を、parse_args() の呼び出しとそれ以外に分けて返す"""
+    receivers = set()
+    loads = []
+    for node in ast.walk(scope):
+        if (
+            isinstance(node, ast.Attribute)
+            and node.attr in _PARSE_METHODS
+            and isinstance(node.value, ast.Name)
+        ):
+            receivers.add(id(node.value))
+        elif (
+            isinstance(node, ast.Name)
+            and node.id == name
+            and isinstance(node.ctx, ast.Load)
+        ):
+            loads.append(node)
+    parsed = [node for node in loads if id(node) in receivers]
+    others = [node for node in loads if id(node) not in receivers]
+    return parsed, others
+
+
+def _only_parsed(scope, name: str) -> bool:
+    """scope 内で変数 name が parse_args() の呼び出しにしか使われていないかどうか"""
+    parsed, others = _name_uses(scope, name)
+    return bool(parsed) and not others
+
+
+def _is_parsed_builder(tree: ast.Module, name: str) -> bool:
+    """
+    builder の戻り値にそのまま parse_args() が呼ばれているかどうか。
+    `build_parser().parse_args()` か、`p = build_parser()` の後に p.parse_args() だけを
+    呼ぶ形を受け付ける。戻り値に引数を追加していると部分的な parser になるので除外する。
+    """
+    scopes = [tree] + [
+        node
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    ]
+    for scope in scopes:
+        for node in ast.walk(scope):
+            if (
+                isinstance(node, ast.Attribute)
+                and node.attr in _PARSE_METHODS
+                and _is_call_to(node.value, name)
+            ):
+                return True
+            if (
+                isinstance(node, ast.Assign)
+                and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and _is_call_to(node.value, name)
+                and _only_parsed(scope, node.targets[0].id)
+            ):
+                return True
+    return False
+
+
+def _parse_script(path: str):
+    try:
+        with open(path, "rb") as f:
+            return ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+
+def _defines_module_parser(tree: ast.Module) -> bool:
+    """モジュール直下で `parser = ...` を代入しているかどうか"""
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign):
+            targets = [node.target]
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == "parser" for t in targets):
+            return True
+    return False
+
+
+def _is_main_block(node) -> bool:
+    return isinstance(node, ast.If) and any(
+        isinstance(n, ast.Name) and n.id == "__name__" for n in ast.walk(node.test)
+    )
+
+
+def _import_time_nodes(tree: ast.Module):
+    """import 時に実行される箇所 (関数の本体と __main__ のブロック以外) のノード"""
+    stack = [node for node in tree.body if not _is_main_block(node)]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            # デコレータと引数の既定値は import 時に評価される
+            stack.extend(node.decorator_list)
+            stack.extend(node.args.defaults)
+            stack.extend(d for d in node.args.kw_defaults if d is not None)
+        elif not isinstance(node, ast.Lambda):
+            stack.extend(ast.iter_child_nodes(node))
+
+
+def _module_parser_names(tree: ast.Module) -> set:
+    """parser と、モジュール直下で parser から作られた変数 (add_subparsers() の戻り値など)"""
+    names = {"parser"}
+    bindings = []
+    for node in _import_time_nodes(tree):
+        if isinstance(node, ast.Assign):
+            bindings.append((node.value, node.targets))
+        elif isinstance(node, (ast.AnnAssign, ast.AugAssign, ast.NamedExpr)):
+            if node.value is not None:
+                bindings.append((node.value, [node.target]))
+        elif isinstance(node, ast.withitem) and node.optional_vars is not None:
+            bindings.append((node.context_expr, [node.optional_vars]))
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            bindings.append((node.iter, [node.target]))
+
+    changed = True
+    while changed:
+        changed = False
+        for value, targets in bindings:
+            if not any(
+                isinstance(n, ast.Name) and n.id in names for n in ast.walk(value)
+            ):
+                continue
+            for target in targets:
+                for n in ast.walk(target):
+                    if isinstance(n, ast.Name) and n.id not in names:
+                        names.add(n.id)
+                        changed = True
+    return names
+
+
+def _mutates_module_parser(tree: ast.Module) -> bool:
+    """
+    import 時に実行されない箇所 (関数や __main__ のブロック) で、parser を parse_args()
+    以外に使っているか、parser から作った変数 (サブコマンドやグループ) を使っているかどうか
+    """
+    names = _module_parser_names(tree)
+    deferred = [node for node in tree.body if _is_main_block(node)] + [
+        node
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda))
+    ]
+    for scope in deferred:
+        for name in names:
+            parsed, others = _name_uses(scope, name)
+            if others or (parsed and name != "parser"):
+                return True
+        for node in ast.walk(scope):
+            if isinstance(node, ast.Global) and names.intersection(node.names):
+                return True
+            if (
+                _is_main_block(scope)
+                and isinstance(node, ast.Name)
+                and node.id in names
+                and isinstance(node.ctx, ast.Store)
+            ):
+                return True
+    return False
+
+
+def _reads_only_literal_constants(tree: ast.Module, builder: ast.FunctionDef) -> bool:
+    """
+    builder が読むモジュール変数が、モジュール直下でリテラルを代入されるだけで
+    他の文・デコレータ・関数から使われも変更もされない定数だけかどうか
+    """
+    inner = {id(node) for node in ast.walk(builder)}
+    bound = {
+        node.id
+        for node in ast.walk(builder)
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load)
+    }
+    bound.update(arg.arg for arg in ast.walk(builder.args) if isinstance(arg, ast.arg))
+    free = {
+        node.id
+        for node in ast.walk(builder)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    } - bound
+    # argparse の import で束縛される名前は、抽出したモジュールでも同じものになる
+    for node in tree.body:
+        node = _argparse_import(node)
+        if node is not None:
+            free.difference_update(
+                (alias.asname or alias.name).partition(".")[0] for alias in node.names
+            )
+
+    constants = {
+        id(target)
+        for node in tree.body
+        if _is_literal_assign(node)
+        for target in node.targets
+    }
+    uses = collections.Counter()
+    for node in ast.walk(tree):
+        if id(node) in inner:
+            continue
+        if isinstance(node, ast.Name):
+            names = [node.id]
+            if id(node) in constants:
+                # モジュール直下のリテラルの代入そのものは数えない
+                uses[node.id] -= 1
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names = [node.name]
+        elif isinstance(node, ast.alias):
+            names = [(node.asname or node.name).partition(".")[0]]
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names = node.names
+        else:
+            continue
+        uses.update(name for name in names if name in free)
+    return not any(uses[name] for name in free)
+
+
+def load_parser_from_ast(path: str, tree: ast.Module):
+    """
+    parse_args() される parser を組み立てて返す関数 (build_parser() など) があれば、
+    その関数だけを実行する。スクリプト全体を実行しないので、重いモジュールの import を避けられる。
+    見つからない、または実行に失敗した場合は None を返す。
+    """
+    builder = next(
+        (
+            node
+            for node in tree.body
+            if isinstance(node, ast.FunctionDef)
+            and not node.decorator_list
+            and _takes_no_required_args(node)
+            and _returns_argument_parser(node)
+            and _is_parsed_builder(tree, node.name)
+        ),
+        None,
+    )
+    if builder is None or not _reads_only_literal_constants(tree, builder):
+        return None
+
+    # argparse の import とリテラルの定数だけを残し、関数本体から参照できるようにする
+    body = []
+    for node in tree.body:
+        if _is_literal_assign(node):
+            body.append(node)
+        else:
+            node = _argparse_import(node)
+            if node is not None:
+                body.append(node)
+    body.append(builder)
+    module = ast.Module(body=body, type_ignores=[])
+    namespace = {"argparse": argparse, "__name__": "__argcompgen__", "__file__": path}
+
+    try:
+        exec(compile(module, path, "exec"), namespace)
+        parser = namespace[builder.name]()
+    except (Exception, SystemExit):
+        # 他の関数やモジュールに依存している場合は runpy での実行に任せる
+        return None
+
+    if not isinstance(parser, argparse.ArgumentParser):
+        return None
+    return parser
+
+
+def load_parser_from_module(path: str):
+    """
+    スクリプトを __main__ 以外の名前で import し、モジュール直下の `parser` を返す。
+    if __name__ == "__main__": 以下 (main() の呼び出しなど) は実行されない。
+    None を返した場合は呼び出し側が runpy で実行し直すので、
+    モジュール直下の処理 (print など) は 2 回実行される。
+    """
+    spec = importlib.util.spec_from_file_location("__argcompgen_cli__", path)
+    if spec is None or spec.loader is None:
+        # 拡張子が .py でないスクリプトなど
+        return None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    try:
+        spec.loader.exec_module(module)
+    except (Exception, SystemExit):
+        # __main__ として実行しないと動かないスクリプトは runpy での実行に任せる
+        return None
+    finally:
+        sys.modules.pop(spec.name, None)
+
+    parser = getattr(module, "parser", None)
+    if not isinstance(parser, argparse.ArgumentParser):
+        return None
+    return parser
+
+
+class _Captured(BaseException):
+    """
+    parse_args() の呼び出しを捕捉したことを示す。
+    BaseException を継承しているので、スクリプト側の except Exception には捕まらない。
+    """
 
 
 def load_parser_safely(path: str) -> argparse.ArgumentParser:
-    global captured_parser
-    original_parse_args = argparse.ArgumentParser.parse_args
+    # parse_known_args() は差し替えない (事前パース用の parser を捕捉してしまうため)
+    originals = {
+        name: getattr(argparse.ArgumentParser, name)
+        for name in _PARSE_METHODS
+        if hasattr(argparse.ArgumentParser, name)
+    }
+    owner = threading.get_ident()
+    # 呼び出しごとに用意するので、以前の呼び出しで捕捉した parser が返ることはない
+    captured = []
 
-    def fake_parse_args(self, *args, **kwargs):
-        """parse_args() が呼ばれた瞬間に捕捉して停止する"""
-        global captured_parser
-        captured_parser = self
-        raise StopIteration("Parser captured before parsing args")
+    def make_fake(original):
+        def fake_parse_args(self, *args, **kwargs):
+            """parse_args() / parse_intermixed_args() が呼ばれた瞬間に捕捉して停止する"""
+            if threading.get_ident() != owner:
+                # スクリプトが起動した別スレッドからの呼び出しは本来の動作のまま
+                return original(self, *args, **kwargs)
+            captured.append(self)
+            raise _Captured()
+
+        return fake_parse_args
 
     # 一時的に差し替える
-    argparse.ArgumentParser.parse_args = fake_parse_args
+    for name, original in originals.items():
+        setattr(argparse.ArgumentParser, name, make_fake(original))
 
     try:
+        tree = _parse_script(path)
+        if tree is not None:
+            # parser を返す関数だけを実行できれば、スクリプト全体は実行しない
+            parser = load_parser_from_ast(path, tree)
+            if parser is not None:
+                return parser
+
+            # モジュール直下の parser が import 時点で完成していれば、
+            # __main__ のブロックは実行しない
+            if _defines_module_parser(tree) and not _mutates_module_parser(tree):
+                parser = load_parser_from_module(path)
+                if parser is not None:
+                    return parser
+
         # __main__ をシミュレートしてスクリプトを安全に実行
         runpy.run_path(path, run_name="__main__")
-    except StopIteration:
+    except _Captured:
         # 想定通り、parse_args直前で停止
         pass
     except Exception as e:
@@ -33,230 +431,566 @@ def load_parser_safely(path: str) -> argparse.ArgumentParser:
         sys.exit(1)
     finally:
         # 元に戻す
-        argparse.ArgumentParser.parse_args = original_parse_args
+        for name, original in originals.items():
+            setattr(argparse.ArgumentParser, name, original)
 
-    if not captured_parser:
+    if not captured:
         print("❌ parser not found")
+        sys.exit(1)
 
-    return captured_parser
-
-
-def generate_bash_completion(parser, prog_name: str, func_name=None, level=0, cmd=None):
-    func_name = func_name or f"_{prog_name.replace('-', '_')}"
-    indent = "    " * level
-    script = []
+    return captured[0]
 
-    script.append(f"{func_name}() {{")
-    script.append(f"{indent}local cur prev words cword")
-    script.append(f"{indent}cur=${{COMP_WORDS[COMP_CWORD]}}")
-    script.append(f"{indent}prev=${{COMP_WORDS[COMP_CWORD-1]}}")
-    script.append(f"{indent}COMPREPLY=()")
 
-    # オプションとそのタイプを収集
-    options_store = []  # store
+def collect_actions(
+    parser: argparse.ArgumentParser, _SubParsersAction=argparse._SubParsersAction
+):
+    """オプションを store_true/store_false とそれ以外に分類したリストと subparsers を返す"""
     options_flag = []  # store_true / store_false
+    options_store = []  # store
+    subparsers_action = None
     for a in parser._actions:
-        if a.option_strings:
-            if a.nargs in [0, None] and a.const in [
-                True,
-                False,
-            ]:  # store_true / store_false
+        if isinstance(a, _SubParsersAction):
+            subparsers_action = a
+        elif a.option_strings:
+            if a.nargs in (0, None) and a.const in (True, False):
                 options_flag.extend(a.option_strings)
             else:  # store または引数付き
                 options_store.extend(a.option_strings)
+    return options_flag, options_store, subparsers_action
+
 
-    # 排他グループの解析
+def collect_mutex_groups(parser: argparse.ArgumentParser):
+    """排他グループごとのオプション名のリストを返す"""
     mutex_groups = []
     for group in parser._mutually_exclusive_groups:
-        group_opts = [o for a in group._group_actions for o in (a.option_strings or [])]
+        group_opts = [o for a in group._group_actions for o in a.option_strings]
         if group_opts:
             mutex_groups.append(group_opts)
+    return mutex_groups
+
+
+@functools.lru_cache(maxsize=None)
+def _braceify(option_strings: tuple) -> str:
+    """zsh の _arguments 用にオプション名をまとめる (-v または {-v,--verbose})"""
+    if len(option_strings) == 1:
+        return option_strings[0]
+    return "{" + ",".join(option_strings) + "}"
+
+
+# zsh の _arguments の説明やメッセージで特別な意味を持つ文字のエスケープ表
+_ZSH_ESC = str.maketrans({"'": "'\\''", "[": "\\[", "]": "\\]", ":": "\\:"})
+# _describe の説明はシングルクォートだけエスケープすればよい
+_ZSH_QUOTE = str.maketrans({"'": "'\\''"})
+
+
+def _desc(a: argparse.Action, _cache={}) -> str:
+    """zsh 用にエスケープしたヘルプ文字列を返す (アクションごとにキャッシュする)"""
+    entry = _cache.get(id(a))
+    # id は使い回されることがあるので、同じアクションかどうかも確認する
+    if entry is None or entry[0] is not a:
+        entry = _cache[id(a)] = (a, (a.help or "").translate(_ZSH_ESC))
+    return entry[1]
+
+
+def complete_branch(parser: argparse.ArgumentParser, words, cur: str):
+    """入力済みの単語に沿ってサブコマンドを辿り、カーソル位置の補完候補だけを返す"""
+    options_flag, options_store, subparsers_action = collect_actions(parser)
+    for word in words:
+        if subparsers_action and word in subparsers_action.choices:
+            parser = subparsers_action.choices[word]
+            options_flag, options_store, subparsers_action = collect_actions(parser)
 
-    # サブコマンドの処理
-    subparsers_action = next(
-        (a for a in parser._actions if isinstance(a, argparse._SubParsersAction)), None
-    )
     if subparsers_action:
-        subcommands = list(subparsers_action.choices.keys())
-        script.append(f"{indent}local subcmds='{ ' '.join(subcommands) }'")
+        candidates = list(subparsers_action.choices) + options_flag
+    else:
+        # store_true / store_false は未入力のものだけ候補に出す
+        candidates = [o for o in options_flag if o not in words] + options_store
 
-        script.append(f"{indent}if [ $COMP_CWORD -eq {level + 1} ]; then")
-        # ここで store_true/false のみ表示、store は入力済みなら除外
-        script.append(
-            f"{indent}    COMPREPLY=( $(compgen -W \"$subcmds {' '.join(options_flag)}\" -- \"$cur\") )"
+    return [c for c in candidates if c.startswith(cur)]
+
+
+def _complete_branch_main(argv):
+    """`--complete-branch PATH WORDS... -- CUR` を処理する (補完スタブから呼ばれる)"""
+    if len(argv) < 3 or argv[-2] != "--":
+        print(
+            "usage: argcompgen --complete-branch PATH [WORDS ...] -- CUR",
+            file=sys.stderr,
         )
-        script.append(f"{indent}    return 0")
-        script.append(f"{indent}fi")
+        sys.exit(2)
+    path, words, cur = argv[0], argv[1:-2], argv[-1]
+
+    # 補完候補以外の出力で COMPREPLY が汚れないようにする
+    with contextlib.redirect_stdout(sys.stderr):
+        parser = load_parser_safely(path)
+    for candidate in complete_branch(parser, words, cur):
+        print(candidate)
 
-        # サブコマンドごとの再帰
-        script.append(f"{indent}case ${{COMP_WORDS[1]}} in")
-        sub_command_func = []
+
+def _complete_branch_command(path: str) -> str:
+    return " ".join(
+        shlex.quote(s)
+        for s in [sys.executable, "-m", "argcompgen.main", "--complete-branch", path]
+    )
+
+
+def generate_bash_lazy_completion(path: str, prog_name: str, cmd=None):
+    """補完のたびに argcompgen を呼び出す bash 用スタブを生成する"""
+    func_name = f"_{prog_name.replace('-', '_')}"
+    complete_cmd = _complete_branch_command(path)
+    return "\n".join(
+        [
+            f"{func_name}() {{",
+            "    local cur=${COMP_WORDS[COMP_CWORD]}",
+            f'    COMPREPLY=( $({complete_cmd} "${{COMP_WORDS[@]:1:COMP_CWORD-1}}" -- "$cur" 2>/dev/null) )',
+            "    return 0",
+            "}",
+            f"complete -F {func_name} {cmd}",
+            "",
+        ]
+    )
+
+
+def generate_zsh_lazy_completion(path: str, prog_name: str, cmd=None):
+    """補完のたびに argcompgen を呼び出す zsh 用スタブを生成する"""
+    complete_cmd = _complete_branch_command(path)
+    return "\n".join(
+        [
+            f"#compdef {cmd}",
+            "",
+            f"_{prog_name}() {{",
+            "  local -a candidates",
+            f'  candidates=( ${{(f)"$({complete_cmd} "${{(@)words[2,CURRENT-1]}}" -- "${{words[CURRENT]}}" 2>/dev/null)"}} )',
+            "  compadd -a candidates",
+            "}",
+            "",
+            f"compdef _{prog_name} {cmd}",
+            "",
+        ]
+    )
+
+
+def parser_to_dict(
+    parser: argparse.ArgumentParser,
+    memo=None,
+    _SubParsersAction=argparse._SubParsersAction,
+) -> dict:
+    """補完に必要なパーサの構造を JSON に書き出せる dict に変換する"""
+    # 共有された subparser は同じ dict を使い回す
+    if memo is None:
+        memo = {}
+    if id(parser) in memo:
+        return memo[id(parser)]
+
+    options_flag, options_store, subparsers_action = collect_actions(parser)
+    mutex_groups = collect_mutex_groups(parser)
+
+    positionals = [
+        {
+            "name": a.metavar or a.dest,
+            "choices": [str(c) for c in a.choices] if a.choices else [],
+        }
+        for a in parser._actions
+        if not a.option_strings and not isinstance(a, _SubParsersAction)
+    ]
+
+    node = memo[id(parser)] = {
+        "options_flag": options_flag,
+        "options_store": options_store,
+        "mutex_groups": mutex_groups,
+        "positionals": positionals,
+        "subcommands": {},
+    }
+    if subparsers_action:
+        for name, subparser in subparsers_action.choices.items():
+            node["subcommands"][name] = parser_to_dict(subparser, memo)
+    return node
+
+
+def get_config_dir() -> str:
+    """--json で生成した JSON の保存先を返す"""
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config_home, "argcompgen")
+
+
+def generate_bash_json_completion(json_path: str, prog_name: str, cmd=None):
+    """JSON を読む静的ドライバに補完を任せる bash 用スタブを生成する"""
+    func_name = f"_{prog_name.replace('-', '_')}"
+    driver = shlex.quote(os.path.join(SHARE_DIR, "driver.bash"))
+    return "\n".join(
+        [
+            f"source {driver}",
+            f"{func_name}() {{",
+            f"    _argcompgen_driver_bash {shlex.quote(json_path)}",
+            "}",
+            f"complete -F {func_name} {cmd}",
+            "",
+        ]
+    )
+
+
+def generate_zsh_json_completion(json_path: str, prog_name: str, cmd=None):
+    """JSON を読む静的ドライバに補完を任せる zsh 用スタブを生成する"""
+    driver = shlex.quote(os.path.join(SHARE_DIR, "driver.zsh"))
+    return "\n".join(
+        [
+            f"#compdef {cmd}",
+            "",
+            f"source {driver}",
+            "",
+            f"_{prog_name}() {{",
+            f"  _argcompgen_driver_zsh {shlex.quote(json_path)}",
+            "}",
+            "",
+            f"compdef _{prog_name} {cmd}",
+            "",
+        ]
+    )
+
+
+# bash 補完関数のテンプレート (1ノードにつき1回だけ format する)
+# {init} は最上位の関数にだけ入れる。サブコマンドの関数は最上位の関数から呼ばれるので、
+# その local 変数 (cur prev words cword) をそのまま使う
+_BASH_FUNC_HEADER = """\
+{func_name}() {{
+{init}"""
+
+# bash-completion があれば _init_completion に任せる (--opt=value の分割もしてくれる)
+_BASH_INIT = """\
+local cur prev words cword split=false
+if declare -F _init_completion >/dev/null 2>&1; then
+    _init_completion -s || return
+else
+    words=("${COMP_WORDS[@]}")
+    cword=$COMP_CWORD
+    cur=${COMP_WORDS[COMP_CWORD]}
+    prev=${COMP_WORDS[COMP_CWORD-1]}
+fi
+COMPREPLY=()
+$split && return 0
+"""
+
+# サブコマンドを持つノード
+_BASH_FUNC_TEMPLATE = _BASH_FUNC_HEADER + """\
+{indent}local subcmds='{subcmds}'
+{indent}if [ $cword -eq {cword} ]; then
+{indent}    COMPREPLY=( $(compgen -W "$subcmds {options_flag}" -- "$cur") )
+{indent}    return 0
+{indent}fi
+{indent}case ${{words[1]}} in
+{case_body}{indent}esac
+{indent}return 0
+}}"""
+
+# 末端のノード
+# store_true / store_false は読み込み時に連想配列にしておき、カーソルより前の単語を
+# 1 回ずつ引くだけで未入力のものを求める (補完のたびに外部コマンドは起動しない)
+# 連想配列と declare -g は bash 4.2 以降にしかないので、それより古い bash (macOS の
+# /bin/bash など) では入力済みの単語と 1 つずつ比較する
+_BASH_HAS_ASSOC = "(( BASH_VERSINFO[0] * 100 + BASH_VERSINFO[1] >= 402 ))"
+_BASH_LEAF_DECLARE = (
+    _BASH_HAS_ASSOC + " && declare -gA {flags_var}=({flags_assoc})\n"
+)
+_BASH_LEAF_TEMPLATE = _BASH_LEAF_DECLARE + _BASH_FUNC_HEADER + """\
+{indent}local w opts_flag=()
+{indent}if """ + _BASH_HAS_ASSOC + """; then
+{indent}    local -A used=()
+{indent}    for w in "${{words[@]:0:cword}}"; do
+{indent}        [[ -n $w && -n ${{{flags_var}[$w]+x}} ]] && used[$w]=1
+{indent}    done
+{indent}    for w in "${{!{flags_var}[@]}}"; do
+{indent}        [[ -n ${{used[$w]+x}} ]] || opts_flag+=("$w")
+{indent}    done
+{indent}else
+{indent}    local f
+{indent}    for f in {options_flag}; do
+{indent}        for w in "${{words[@]:0:cword}}"; do
+{indent}            [[ $w == "$f" ]] && continue 2
+{indent}        done
+{indent}        opts_flag+=("$f")
+{indent}    done
+{indent}fi
+{indent}local opts_store="{options_store}"
+{indent}COMPREPLY=( $(compgen -W "${{opts_flag[*]}} $opts_store" -- "$cur") )
+{indent}return 0
+}}"""
+
+
+# 階層ごとのインデント (これより深い階層はその都度作る)
+_INDENTS = tuple("    " * i for i in range(32))
+
+
+def generate_bash_completion(
+    parser, prog_name: str, out, func_name=None, level=0, cmd=None, memo=None
+):
+    """argparse parser から bash 補完スクリプトを再帰生成し、out に書き出す"""
+    func_name = func_name or f"_{prog_name.replace('-', '_')}"
+    indent = _INDENTS[level] if level < len(_INDENTS) else "    " * level
+    init = _BASH_INIT if level == 0 else ""
+    # 同じ subparser (エイリアスや共有パーサ) は一度だけ生成して関数を使い回す
+    if memo is None:
+        memo = {}
+
+    # オプションとそのタイプ、サブコマンドを収集
+    options_flag, options_store, subparsers_action = collect_actions(parser)
+    flag_str = " ".join(options_flag)
+    store_str = " ".join(options_store)
+
+    # サブコマンドの処理
+    if subparsers_action:
+        # サブコマンドごとの再帰 (サブコマンドの関数は親より前に出力する)
+        case_body = []
         for subcmd, subparser in subparsers_action.choices.items():
-            sub_func = f"{func_name}_{subcmd}"
-            script.append(f"{indent}{subcmd})")
-            script.append(f"{indent}{sub_func}")
-            sub_command_func.append(
+            key = (id(subparser), level + 1)
+            sub_func = memo.get(key)
+            if sub_func is None:
+                sub_func = memo[key] = f"{func_name}_{subcmd}"
                 generate_bash_completion(
-                    subparser, prog_name, func_name=sub_func, level=level + 1
+                    subparser,
+                    prog_name,
+                    out,
+                    func_name=sub_func,
+                    level=level + 1,
+                    memo=memo,
                 )
-            )
-            script.append(f"{indent};;")
-        script.append(f"{indent}esac")
-        script.append(f"{indent}return 0")
+            case_body.append(f"{indent}{subcmd})\n{indent}{sub_func}\n{indent};;\n")
+        # ここで store_true/false のみ表示、store は入力済みなら除外
+        fragment = _BASH_FUNC_TEMPLATE.format(
+            func_name=func_name,
+            init=init,
+            indent=indent,
+            subcmds=" ".join(subparsers_action.choices),
+            cword=level + 1,
+            options_flag=flag_str,
+            case_body="".join(case_body),
+        )
     else:
         # store_true / store_false は未入力なら候補に出す
-        script.append(f"{indent}local opts_flag=\"{' '.join(options_flag)}\"")
-        script.append(f'{indent}for w in "${{COMP_WORDS[@]}}"; do')
-        script.append(f"{indent}    opts_flag=(${{opts_flag[@]/$w/}})")
-        script.append(f"{indent}done")
-
         # store オプションは候補に常に出す（1回だけ補完可能、入力済みを除外したい場合はここでチェック）
-        script.append(f"{indent}local opts_store=\"{' '.join(options_store)}\"")
-
-        # すべてのオプション候補をまとめる
-        script.append(f"{indent}local opts_all=(${{opts_flag[@]}} $opts_store)")
-        script.append(f'{indent}local opts_all_str="${{opts_all[*]}}"')
-        script.append(
-            f'{indent}COMPREPLY=( $(compgen -W "${{opts_all_str}}" -- "$cur") )'
+        fragment = _BASH_LEAF_TEMPLATE.format(
+            func_name=func_name,
+            init=init,
+            indent=indent,
+            # 関数名と違い、変数名には - や : . を使えない
+            flags_var="_" + re.sub(r"\W", "_", func_name) + "_flags",
+            flags_assoc=" ".join(f"[{o}]=1" for o in options_flag),
+            options_flag=flag_str,
+            options_store=store_str,
         )
-        script.append(f"{indent}return 0")
 
-    script.append("}")
+    print(fragment, file=out)
     if level == 0:
-        script.append(f"complete -F {func_name} {cmd}")
-
-    if subparsers_action:
-        script = sub_command_func + script
-
-    return "\n".join(script)
+        print(f"complete -F {func_name} {cmd}", file=out)
 
 
 def generate_zsh_completion(
-    parser: argparse.ArgumentParser, prog_name=None, level=0, cmd=None
+    parser: argparse.ArgumentParser,
+    prog_name,
+    out,
+    cmd=None,
+    _SubParsersAction=argparse._SubParsersAction,
+    _OPTIONAL=argparse.OPTIONAL,
 ):
-    """argparse parser から zsh 補完スクリプトを再帰生成する"""
+    """
+    argparse parser から zsh 補完スクリプトを生成し、out に書き出す
+    (_SubParsersAction, _OPTIONAL はループ内でローカル変数として参照するための既定引数)
+    """
     if prog_name is None:
         prog_name = parser.prog
+    root_func_name = f"_{prog_name}"
 
-    lines = []
+    # サブコマンドは再帰せず、キューで幅優先に辿る
+    # 同じ subparser (エイリアスや共有パーサ) は一度だけ生成して関数を使い回す
+    memo = {id(parser): root_func_name}
+    queue = collections.deque([(parser, prog_name)])
+    bufs = []
+    while queue:
+        parser, prog_name = queue.popleft()
 
-    lines.append(f"\n_{prog_name}() {{")
+        # 子の関数を親より前に出力するため、ノードごとにバッファしておく
+        buf = io.StringIO()
+        bufs.append(buf)
 
-    # _arguments の構築
-    args_lines = []
-    state_cases = []
+        print(f"\n_{prog_name}() {{", file=buf)
 
-    # 排他グループを一時的にマーク
-    exclusive_opts = set()
-    for group in parser._mutually_exclusive_groups:
-        group_opts = []
-        for a in group._group_actions:
-            if a.option_strings:
-                group_opts.extend(a.option_strings)
-        if group_opts:
-            excl_str = f"({' '.join(group_opts)})"
-            for a in group._group_actions:
-                if a.option_strings:
-                    if len(a.option_strings) == 1:
-                        opts = a.option_strings[0]
-                    else:
-                        opts = "{" + ",".join(a.option_strings) + "}"
-                    args_lines.append(f"'{excl_str}'{opts}'[{a.help or ''}]'")
-                    exclusive_opts.update(a.option_strings)
-
-    positional_count = 1
-    # 通常のオプション・引数
-    for a in parser._actions:
-        # 排他グループで既に処理済みならスキップ
-        if any(opt in exclusive_opts for opt in a.option_strings):
-            continue
+        # _arguments の構築
+        args_lines = []
+        state_cases = []
 
-        if isinstance(a, argparse._SubParsersAction):
-            # サブコマンド
-            subcmds = list(a.choices.keys())
-            args_lines.append(f"'1: :->subcmd'")
-            # 再帰的に各サブコマンドの補完関数を生成
-            for action in a._choices_actions:
-                action: argparse.Action = action
-                sub_name = action.dest
-                sub_help = action.help
-                sub_parser = a.choices[sub_name]
-                sub_func = generate_zsh_completion(
-                    sub_parser, f"{prog_name}_{sub_name}", level + 1
-                )
-                state_cases.append((sub_name, sub_func, sub_help))
-        elif a.option_strings:
-            # オプション引数
-            if len(a.option_strings) == 1:
-                opts = a.option_strings[0]
-            else:
-                opts = "{" + ",".join(a.option_strings) + "}"
-            if a.nargs in [argparse.OPTIONAL, None]:
-                if a.metavar or a.dest:
-                    args_lines.append(
-                        f"{opts}'[{a.help or ''}]:{a.metavar or a.dest}:_files'"
-                    )
+        # 排他グループを一時的にマーク
+        exclusive_opts = set()
+        for group in parser._mutually_exclusive_groups:
+            group_opts = " ".join(
+                o for a in group._group_actions for o in a.option_strings
+            )
+            if group_opts:
+                excl_str = f"({group_opts})"
+                for a in group._group_actions:
+                    if a.option_strings:
+                        opts = _braceify(tuple(a.option_strings))
+                        args_lines.append(f"'{excl_str}'{opts}'[{_desc(a)}]'")
+                        exclusive_opts.update(a.option_strings)
+
+        positional_count = 1
+        # 通常のオプション・引数
+        for a in parser._actions:
+            # 排他グループで既に処理済みならスキップ
+            if any(opt in exclusive_opts for opt in a.option_strings):
+                continue
+
+            if isinstance(a, _SubParsersAction):
+                # サブコマンド
+                args_lines.append(f"'1: :->subcmd'")
+                # 各サブコマンドの補完関数はキューに積んで後で生成する
+                # (エイリアスも choices に含まれるので、同じ関数を使い回して補完できる)
+                helps = {ca.dest: ca.help for ca in a._choices_actions}
+                for sub_name, sub_parser in a.choices.items():
+                    sub_help = helps.get(sub_name, "")
+                    sub_func_name = memo.get(id(sub_parser))
+                    if sub_func_name is None:
+                        sub_func_name = f"_{prog_name}_{sub_name}"
+                        memo[id(sub_parser)] = sub_func_name
+                        queue.append((sub_parser, f"{prog_name}_{sub_name}"))
+                    state_cases.append((sub_name, sub_func_name, sub_help))
+            elif a.option_strings:
+                # オプション引数
+                opts = _braceify(tuple(a.option_strings))
+                desc = _desc(a)
+                name = a.metavar or a.dest
+                if a.nargs in (_OPTIONAL, None) and name:
+                    name = str(name).translate(_ZSH_ESC)
+                    args_lines.append(f"{opts}'[{desc}]:{name}:_files'")
                 else:
-                    args_lines.append(f"{opts}'[{a.help or ''}]'")
+                    args_lines.append(f"{opts}'[{desc}]'")
             else:
-                args_lines.append(f"{opts}'[{a.help or ''}]'")
-        else:
-            # 位置引数
-            name = a.metavar or a.dest
-            position = positional_count
-            positional_count += 1
-            choise = "(" + " ".join(a.choices) + ")" if a.choices else "_files"
-            args_lines.append(f"'{position}:{name}:{choise}'")
-
-    # 可変長引数の例
-    args_lines.append("'*:: :->args'")
-
-    # _arguments 出力
-    lines.append("  _arguments -C \\")
-    for arg_line in args_lines:
-        lines.append(indent(f"{arg_line} \\", "    "))
-    lines[-1] = lines[-1].rstrip(" \\")  # 最後の行のバックスラッシュを削除
-
-    # サブコマンドの説明リスト
-    if state_cases:
-        lines.append("")
-        lines.append("  subcommand=(")
-        for sub_name, _, sub_help in state_cases:
-            lines.append(f"    '{sub_name}:{sub_help}' \\")
-        lines.append("  )")
-
-    # 状態遷移 case
-    if state_cases:
-        lines.append("")
-        lines.append("  case $state in")
-        lines.append("    subcmd)")
-        lines.append("      _describe '' subcommand")
-        lines.append("      ;;")
-        lines.append("    args)")
-        lines.append("      case $words[1] in")
-        for sub_name, _, _ in state_cases:
-            lines.append(f"        {sub_name})")
-            lines.append(f"          _{prog_name}_{sub_name}")
-            lines.append("          ;;")
-        lines.append("      esac")
-        lines.append("      ;;")
-        lines.append("  esac")
-
-    lines.append("}")
-
-    # サブコマンド補完関数を後ろに追加
-    for _, sub_func, _ in state_cases:
-        lines = [sub_func] + lines
+                # 位置引数
+                name = str(a.metavar or a.dest).translate(_ZSH_ESC)
+                position = positional_count
+                positional_count += 1
+                choise = "(" + " ".join(a.choices) + ")" if a.choices else "_files"
+                args_lines.append(f"'{position}:{name}:{choise}'")
 
-    if level == 0:
-        lines = (
-            [f"#compdef {cmd}"] + lines + [f"\ncompdef _{prog_name} {cmd}"]
+        # 可変長引数の例
+        args_lines.append("'*:: :->args'")
+
+        # _arguments 出力 (最後の行にはバックスラッシュを付けない)
+        print("  _arguments -C \\", file=buf)
+        print(
+            " \\\n".join(f"    {arg_line}" for arg_line in args_lines),
+            file=buf,
         )
 
-    return "\n".join(lines)
+        # サブコマンドの説明リスト
+        if state_cases:
+            print("", file=buf)
+            print("  subcommand=(", file=buf)
+            for sub_name, _, sub_help in state_cases:
+                sub_help = (sub_help or "").translate(_ZSH_QUOTE)
+                print(f"    '{sub_name}:{sub_help}' \\", file=buf)
+            print("  )", file=buf)
+
+        # 状態遷移 case
+        if state_cases:
+            print("", file=buf)
+            print("  case $state in", file=buf)
+            print("    subcmd)", file=buf)
+            print("      _describe '' subcommand", file=buf)
+            print("      ;;", file=buf)
+            print("    args)", file=buf)
+            print("      case $words[1] in", file=buf)
+            for sub_name, sub_func_name, _ in state_cases:
+                print(f"        {sub_name})", file=buf)
+                print(f"          {sub_func_name}", file=buf)
+                print("          ;;", file=buf)
+            print("      esac", file=buf)
+            print("      ;;", file=buf)
+            print("  esac", file=buf)
+
+        print("}", file=buf)
+
+    # 子は必ず親より後にキューへ積まれるので、逆順に出力すれば子が親より前になる
+    print(f"#compdef {cmd}", file=out)
+    for buf in reversed(bufs):
+        out.write(buf.getvalue())
+    print(f"\ncompdef {root_func_name} {cmd}", file=out)
+
+
+def get_cache_dir() -> str:
+    """生成済み補完スクリプトのキャッシュディレクトリを返す"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "argcompgen")
+
+
+def load_cache_meta(meta_path: str):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_stdlib_file(path: str) -> bool:
+    paths = sysconfig.get_paths()
+    if any(path.startswith(paths[k] + os.sep) for k in ("purelib", "platlib")):
+        return False
+    return any(path.startswith(paths[k] + os.sep) for k in ("stdlib", "platstdlib"))
+
+
+def imported_module_mtimes(before) -> dict:
+    """before 以降に import された、標準ライブラリ以外のモジュールのファイルと更新時刻"""
+    mtimes = {}
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name in before or not path:
+            continue
+        path = os.path.abspath(path)
+        if _is_stdlib_file(path):
+            continue
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+    return mtimes
+
+
+def is_cache_fresh(cached_meta, meta: dict) -> bool:
+    """キャッシュのメタ情報が meta と一致し、依存するモジュールも更新されていないかどうか"""
+    if not isinstance(cached_meta, dict):
+        return False
+    dependencies = cached_meta.get("dependencies")
+    if not isinstance(dependencies, dict):
+        return False
+    if {k: v for k, v in cached_meta.items() if k != "dependencies"} != meta:
+        return False
+    for path, mtime_ns in dependencies.items():
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def store_cache(cache_dir: str, key: str, shell: str, meta: dict, output_path: str):
+    """生成結果をキャッシュへ保存する (一時ファイル経由で置き換えるのでアトミック)"""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cached = os.path.join(cache_dir, f"{key}.{shell}")
+        shutil.copyfile(output_path, f"{cached}.tmp")
+        os.replace(f"{cached}.tmp", cached)
+        meta_path = os.path.join(cache_dir, f"{key}.json")
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+    except OSError:
+        # キャッシュに書けなくても生成自体は成功しているので無視する
+        pass
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--complete-branch":
+        _complete_branch_main(sys.argv[2:])
+        return
+
     argparser = argparse.ArgumentParser(
         description="Generate bash/zsh completion scripts from an argparse-based CLI"
     )
@@ -266,6 +1000,22 @@ def main():
     argparser.add_argument(
         "-c", "--command", help="Command name (if different from script name)"
     )
+    argparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always regenerate instead of reusing the cached completion script",
+    )
+    mode = argparser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Generate a small stub that asks argcompgen for candidates on each completion",
+    )
+    mode.add_argument(
+        "--json",
+        action="store_true",
+        help="Write the parser structure as JSON and generate a stub for the static jq-based driver",
+    )
     args = argparser.parse_args()
 
     path = args.path_to_shell
@@ -288,18 +1038,76 @@ def main():
 
     file_name = os.path.basename(prog).split(".")[0]
 
-    parser = load_parser_safely(path)
-
     if shell == "bash":
-        with open(f"{output_dir}/{file_name}", "w") as f:
-            f.write(generate_bash_completion(parser, prog, cmd=cmd))
+        output_path = f"{output_dir}/{file_name}"
     elif shell == "zsh":
-        with open(f"{output_dir}/_{file_name}", "w") as f:
-            f.write(generate_zsh_completion(parser, prog, cmd=cmd))
+        output_path = f"{output_dir}/_{file_name}"
     else:
         print("Error: shell must be 'bash' or 'zsh'")
         sys.exit(1)
 
+    abs_path = os.path.abspath(path)
+
+    # スタブはスクリプトのパスしか使わないので、パーサの読み込みもキャッシュも不要
+    if args.lazy:
+        with open(output_path, "w") as f:
+            if shell == "bash":
+                f.write(generate_bash_lazy_completion(abs_path, prog, cmd=cmd))
+            else:
+                f.write(generate_zsh_lazy_completion(abs_path, prog, cmd=cmd))
+        return
+
+    # パーサの構造だけを JSON に書き出し、補完は静的なドライバに任せる
+    if args.json:
+        parser = load_parser_safely(path)
+        config_dir = get_config_dir()
+        os.makedirs(config_dir, exist_ok=True)
+        json_path = os.path.join(config_dir, f"{file_name}.json")
+        with open(json_path, "w") as f:
+            json.dump(parser_to_dict(parser), f)
+        with open(output_path, "w") as f:
+            if shell == "bash":
+                f.write(generate_bash_json_completion(json_path, prog, cmd=cmd))
+            else:
+                f.write(generate_zsh_json_completion(json_path, prog, cmd=cmd))
+        return
+
+    # スクリプトが変更されていなければ前回の生成結果をそのまま使う
+    st = os.stat(abs_path)
+    meta = {
+        "path": abs_path,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "shell": shell,
+        "prog": prog,
+        "cmd": cmd,
+        # argcompgen 自体を更新したら、古い生成結果は使わない
+        "generator_mtime_ns": os.stat(__file__).st_mtime_ns,
+    }
+    key = hashlib.blake2b("|".join(str(v) for v in meta.values()).encode()).hexdigest()
+    cache_dir = get_cache_dir()
+    cached = os.path.join(cache_dir, f"{key}.{shell}")
+    if not args.no_cache and os.path.isfile(cached):
+        cached_meta = load_cache_meta(os.path.join(cache_dir, f"{key}.json"))
+        if is_cache_fresh(cached_meta, meta):
+            shutil.copyfile(cached, output_path)
+            return
+
+    # スクリプトが import したモジュールを更新した場合も、古い生成結果は使わない
+    before = set(sys.modules)
+    parser = load_parser_safely(path)
+    meta["dependencies"] = imported_module_mtimes(before)
+
+    if shell == "bash":
+        with open(output_path, "w") as f:
+            generate_bash_completion(parser, prog, f, cmd=cmd)
+    else:
+        with open(output_path, "w") as f:
+            generate_zsh_completion(parser, prog, f, cmd=cmd)
+
+    if not args.no_cache:
+        store_cache(cache_dir, key, shell, meta, output_path)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,19 @@
+# argcompgen --json で生成した JSON を読んで補完する bash 用ドライバ (jq 1.6 以降が必要)
+#
+#   source /path/to/driver.bash
+#   _prog() { _argcompgen_driver_bash /path/to/prog.json; }
+#   complete -F _prog prog
+
+_ARGCOMPGEN_CANDIDATES_JQ="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)/candidates.jq"
+
+_argcompgen_driver_bash() {
+    local json=$1
+    local cur=${COMP_WORDS[COMP_CWORD]}
+    # jq 1.6 は --args の後ろでも "-" で始まる単語をオプションとして解釈するので、
+    # 入力済みの単語は改行区切りの文字列として渡す
+    local words
+    words=$(printf '%s\n' "${COMP_WORDS[@]:1:COMP_CWORD-1}")
+    COMPREPLY=( $(jq -r --arg cur "$cur" --arg words "$words" \
+        -f "$_ARGCOMPGEN_CANDIDATES_JQ" "$json" 2>/dev/null) )
+    return 0
+}
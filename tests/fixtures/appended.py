@@ -0,0 +1,17 @@
+import argparse
+
+NAMES = ["run"]
+NAMES.append("stop")
+NAMES += ["status"]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="appended")
+    sub = parser.add_subparsers(dest="command")
+    for name in NAMES:
+        sub.add_parser(name)
+    return parser
+
+
+if __name__ == "__main__":
+    build_parser().parse_args()
@@ -0,0 +1,11 @@
+import argparse, _argcompgen_missing_module
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="builder")
+    parser.add_argument("--name")
+    return parser
+
+
+if __name__ == "__main__":
+    build_parser().parse_args()
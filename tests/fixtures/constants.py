@@ -0,0 +1,14 @@
+import argparse, _argcompgen_missing_module
+
+PROG = "constants"
+LEVELS = ["debug", "info"]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog=PROG)
+    parser.add_argument("--level", choices=LEVELS)
+    return parser
+
+
+if __name__ == "__main__":
+    build_parser().parse_args()
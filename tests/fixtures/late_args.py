@@ -0,0 +1,17 @@
+import argparse
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="late_args")
+    parser.add_argument("--name")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    parser.add_argument("--late", action="store_true")
+    parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
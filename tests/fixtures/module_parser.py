@@ -0,0 +1,7 @@
+import argparse
+
+parser = argparse.ArgumentParser(prog="module_parser")
+parser.add_argument("--base")
+
+if __name__ == "__main__":
+    raise SystemExit("__main__ block must not run")
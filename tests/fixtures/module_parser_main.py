@@ -0,0 +1,14 @@
+import argparse
+
+parser = argparse.ArgumentParser(prog="module_parser_main")
+parser.add_argument("--base")
+
+
+def main():
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("run")
+    parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
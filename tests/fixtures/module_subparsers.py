@@ -0,0 +1,14 @@
+import argparse
+
+parser = argparse.ArgumentParser(prog="module_subparsers")
+sub = parser.add_subparsers(dest="command")
+
+
+def main():
+    run = sub.add_parser("run")
+    run.add_argument("--fast", action="store_true")
+    parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import argparse
+
+parser = argparse.ArgumentParser(prog="module_subparsers_static")
+sub = parser.add_subparsers(dest="command")
+run = sub.add_parser("run")
+run.add_argument("--fast", action="store_true")
+
+
+def main():
+    parser.parse_args()
+
+
+if __name__ == "__main__":
+    raise SystemExit("__main__ block must not run")
@@ -0,0 +1,17 @@
+import argparse
+
+
+def common():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="parents", parents=[common()])
+    parser.add_argument("--name")
+    return parser
+
+
+if __name__ == "__main__":
+    build_parser().parse_args()
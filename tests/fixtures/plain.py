@@ -0,0 +1,17 @@
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="plain")
+    parser.add_argument("--force", action="store_true")
+    sub = parser.add_subparsers(dest="command")
+    run = sub.add_parser("run").add_subparsers(dest="target")
+    run.add_parser("all")
+    one = run.add_parser("one")
+    one.add_argument("--fast", action="store_true")
+    one.add_argument("--name")
+    parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import argparse
+
+
+def main():
+    conf = argparse.ArgumentParser(add_help=False)
+    conf.add_argument("--config")
+    _, rest = conf.parse_known_args()
+
+    parser = argparse.ArgumentParser(prog="preparser", parents=[conf])
+    parser.add_argument("--real", action="store_true")
+    parser.parse_args(rest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="punctuated")
+    sub = parser.add_subparsers(dest="command")
+    for name in ("add-user", "a:b", "a.b"):
+        sub.add_parser(name).add_argument("--force", action="store_true")
+    parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+
+COMMANDS = {}
+
+
+def command(func):
+    COMMANDS[func.__name__] = func
+    return func
+
+
+@command
+def run():
+    pass
+
+
+@command
+def stop():
+    pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="registry")
+    sub = parser.add_subparsers(dest="command")
+    for name in COMMANDS:
+        sub.add_parser(name)
+    return parser
+
+
+if __name__ == "__main__":
+    build_parser().parse_args()
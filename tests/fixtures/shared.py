@@ -0,0 +1,18 @@
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="shared")
+    parser.add_argument("--verbose", action="store_true")
+    sub = parser.add_subparsers(dest="command")
+    export = sub.add_parser("export", aliases=["ex"])
+    output = export.add_mutually_exclusive_group()
+    output.add_argument("--json", action="store_true")
+    output.add_argument("--yaml", action="store_true")
+    export.add_argument("--quiet", action="store_true")
+    export.add_argument("target", choices=["users", "groups"])
+    parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
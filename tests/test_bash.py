@@ -0,0 +1,57 @@
+import os
+import shlex
+import shutil
+import subprocess
+
+import pytest
+
+from argcompgen.main import (
+    _BASH_HAS_ASSOC,
+    generate_bash_completion,
+    load_parser_safely,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+pytestmark = pytest.mark.skipif(shutil.which("bash") is None, reason="bash not found")
+
+
+@pytest.fixture(params=["assoc", "fallback"])
+def completion(request, tmp_path):
+    parser = load_parser_safely(os.path.join(FIXTURES, "punctuated.py"))
+    script = tmp_path / "punctuated.bash"
+    with open(script, "w") as f:
+        generate_bash_completion(parser, "punctuated", f)
+    if request.param == "fallback":
+        # 連想配列を使えない bash 4.2 未満の経路を通す
+        script.write_text(script.read_text().replace(_BASH_HAS_ASSOC, "false"))
+    return script
+
+
+def complete(script, *words):
+    """COMP_WORDS に words を入れて補完関数を呼び、COMPREPLY を返す"""
+    code = (
+        f"source {script} || exit 1\n"
+        f"COMP_WORDS=(punctuated {shlex.join(words)})\n"
+        "COMP_CWORD=$(( ${#COMP_WORDS[@]} - 1 ))\n"
+        "_punctuated\n"
+        'printf "%s\\n" "${COMPREPLY[@]}"\n'
+    )
+    result = subprocess.run(
+        ["bash", "--norc", "--noprofile", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stderr == ""
+    return set(result.stdout.split())
+
+
+def test_subcommands(completion):
+    assert {"add-user", "a:b", "a.b"} <= complete(completion, "")
+
+
+@pytest.mark.parametrize("subcmd", ["add-user", "a:b", "a.b"])
+def test_punctuated_subcommand_options(completion, subcmd):
+    assert "--force" in complete(completion, subcmd, "--")
+    assert "--force" not in complete(completion, subcmd, "--force", "--")
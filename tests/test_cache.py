@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+import argcompgen.main
+from argcompgen.main import main
+
+ENTRY = """\
+from cache_cli_impl import main
+
+if __name__ == "__main__":
+    main()
+"""
+
+IMPL = """\
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="cache_cli")
+    parser.add_argument("{option}", action="store_true")
+    parser.parse_args()
+"""
+
+
+@pytest.fixture
+def cli(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    (tmp_path / "cache_cli.py").write_text(ENTRY)
+    write_impl(tmp_path, "--old")
+    return tmp_path
+
+
+def write_impl(tmp_path, option, mtime=None):
+    impl = tmp_path / "cache_cli_impl.py"
+    impl.write_text(IMPL.format(option=option))
+    if mtime is not None:
+        os.utime(impl, (mtime, mtime))
+
+
+def generate(tmp_path, monkeypatch, *extra):
+    """main() を実行し、(生成結果, パーサを読み込んだかどうか) を返す"""
+    calls = []
+    load = argcompgen.main.load_parser_safely
+
+    def counting_load(path):
+        calls.append(path)
+        return load(path)
+
+    monkeypatch.setattr(argcompgen.main, "load_parser_safely", counting_load)
+    out = tmp_path / "out"
+    argv = ["argcompgen", str(tmp_path / "cache_cli.py"), "bash", "-d", str(out)]
+    monkeypatch.setattr(sys, "argv", argv + list(extra))
+    try:
+        main()
+    finally:
+        # 次の実行で import し直させる
+        sys.modules.pop("cache_cli_impl", None)
+    return (out / "cache_cli").read_text(), bool(calls)
+
+
+def test_cache_hit(cli, monkeypatch):
+    first, loaded = generate(cli, monkeypatch)
+    assert loaded
+    second, loaded = generate(cli, monkeypatch)
+    assert not loaded
+    assert second == first
+
+
+def test_cache_miss_when_script_changes(cli, monkeypatch):
+    generate(cli, monkeypatch)
+    entry = cli / "cache_cli.py"
+    entry.write_text(ENTRY + "\n")
+    _, loaded = generate(cli, monkeypatch)
+    assert loaded
+
+
+def test_cache_invalidated_by_imported_module(cli, monkeypatch):
+    output, _ = generate(cli, monkeypatch)
+    assert "--old" in output
+    write_impl(cli, "--new", mtime=os.stat(cli / "cache_cli.py").st_mtime + 10)
+    output, loaded = generate(cli, monkeypatch)
+    assert loaded
+    assert "--new" in output and "--old" not in output
+
+
+def test_no_cache_always_regenerates(cli, monkeypatch):
+    generate(cli, monkeypatch)
+    _, loaded = generate(cli, monkeypatch, "--no-cache")
+    assert loaded
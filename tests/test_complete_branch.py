@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from argcompgen.main import (
+    _complete_branch_main,
+    complete_branch,
+    generate_bash_json_completion,
+    generate_bash_lazy_completion,
+    generate_zsh_json_completion,
+    generate_zsh_lazy_completion,
+    load_parser_safely,
+)
+
+PLAIN = os.path.join(os.path.dirname(__file__), "fixtures", "plain.py")
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return load_parser_safely(PLAIN)
+
+
+def test_top_level(parser):
+    assert complete_branch(parser, [], "") == ["run", "--force"]
+
+
+def test_cur_prefix(parser):
+    assert complete_branch(parser, [], "r") == ["run"]
+    assert complete_branch(parser, ["run"], "o") == ["one"]
+
+
+def test_nested_subcommand(parser):
+    assert complete_branch(parser, ["run"], "") == ["all", "one"]
+    assert complete_branch(parser, ["run", "one"], "--") == [
+        "--fast",
+        "--help",
+        "--name",
+    ]
+
+
+def test_consumed_flag(parser):
+    assert complete_branch(parser, ["run", "one", "--fast"], "--") == [
+        "--help",
+        "--name",
+    ]
+
+
+@pytest.mark.parametrize(
+    "argv, expected",
+    [
+        (["--", ""], ["run", "--force"]),
+        (["--", "--"], ["--force"]),
+        (["run", "one", "--", "--f"], ["--fast"]),
+        # 入力済みの単語に -- があっても、区切りとして使うのは最後から 2 番目だけ
+        (["run", "one", "--", "--", "--n"], ["--name"]),
+        (["--", "--", "r"], ["run"]),
+    ],
+)
+def test_main_argv(argv, expected, capsys):
+    _complete_branch_main([PLAIN] + argv)
+    assert capsys.readouterr().out.split() == expected
+
+
+@pytest.mark.parametrize("argv", [[], [PLAIN], [PLAIN, "run"], [PLAIN, "run", "one"]])
+def test_main_usage(argv):
+    with pytest.raises(SystemExit) as e:
+        _complete_branch_main(argv)
+    assert e.value.code == 2
+
+
+@pytest.mark.parametrize(
+    "generate",
+    [
+        generate_bash_lazy_completion,
+        generate_zsh_lazy_completion,
+        generate_bash_json_completion,
+        generate_zsh_json_completion,
+    ],
+)
+def test_stub_ends_with_newline(generate):
+    assert generate(PLAIN, "plain", cmd="plain").endswith(" plain\n")
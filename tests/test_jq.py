@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from argcompgen.main import SHARE_DIR, load_parser_safely, parser_to_dict
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+pytestmark = pytest.mark.skipif(shutil.which("jq") is None, reason="jq not found")
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return parser_to_dict(load_parser_safely(os.path.join(FIXTURES, "shared.py")))
+
+
+@pytest.fixture(scope="module")
+def json_path(tree, tmp_path_factory):
+    path = tmp_path_factory.mktemp("json") / "shared.json"
+    path.write_text(json.dumps(tree))
+    return path
+
+
+def candidates(json_path, *words, cur=""):
+    """driver.bash と同じ引数で candidates.jq を実行し、候補を返す"""
+    result = subprocess.run(
+        [
+            "jq",
+            "-r",
+            "--arg",
+            "cur",
+            cur,
+            "--arg",
+            "words",
+            "\n".join(words),
+            "-f",
+            os.path.join(SHARE_DIR, "candidates.jq"),
+            str(json_path),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+def test_alias_shares_subparser(tree):
+    subcommands = tree["subcommands"]
+    assert subcommands["export"] is subcommands["ex"]
+
+
+def test_top_level(json_path):
+    assert candidates(json_path) == ["export", "ex", "--verbose"]
+    assert candidates(json_path, cur="e") == ["export", "ex"]
+
+
+@pytest.mark.parametrize("subcmd", ["export", "ex"])
+def test_shared_subparser(json_path, subcmd):
+    assert set(candidates(json_path, subcmd, cur="--")) == {
+        "--json",
+        "--yaml",
+        "--quiet",
+        "--help",
+    }
+
+
+def test_mutex_exclusion(json_path):
+    assert set(candidates(json_path, "export", "--json", cur="--")) == {
+        "--quiet",
+        "--help",
+    }
+
+
+def test_positional_choices(json_path):
+    assert candidates(json_path, "export", "--quiet", cur="g") == ["groups"]
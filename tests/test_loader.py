@@ -0,0 +1,93 @@
+import argparse
+import os
+
+from argcompgen.main import load_parser_safely
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load(name):
+    return load_parser_safely(os.path.join(FIXTURES, name))
+
+
+def option_strings(parser):
+    return {o for a in parser._actions for o in a.option_strings}
+
+
+def subcommands(parser):
+    return {
+        name
+        for a in parser._actions
+        if isinstance(a, argparse._SubParsersAction)
+        for name in a.choices
+    }
+
+
+def test_builder_is_run_without_other_imports():
+    parser = load("builder.py")
+    assert parser.prog == "builder"
+    assert option_strings(parser) == {"-h", "--help", "--name"}
+
+
+def test_builder_reads_literal_constants():
+    parser = load("constants.py")
+    assert parser.prog == "constants"
+    assert option_strings(parser) == {"-h", "--help", "--level"}
+
+
+def test_builder_reading_registry_falls_back_to_runpy():
+    assert subcommands(load("registry.py")) == {"run", "stop"}
+
+
+def test_builder_reading_mutated_constant_falls_back_to_runpy():
+    assert subcommands(load("appended.py")) == {"run", "stop", "status"}
+
+
+def test_parent_parser_helper_is_not_taken_as_builder():
+    parser = load("parents.py")
+    assert parser.prog == "parents"
+    assert option_strings(parser) == {"-h", "--help", "--verbose", "--name"}
+
+
+def test_arguments_added_after_builder_are_kept():
+    parser = load("late_args.py")
+    assert option_strings(parser) == {"-h", "--help", "--name", "--late"}
+
+
+def test_runpy_fallback():
+    parser = load("plain.py")
+    assert parser.prog == "plain"
+    assert option_strings(parser) == {"-h", "--help", "--force"}
+    assert subcommands(parser) == {"run"}
+
+
+def test_pre_parser_is_not_captured():
+    parser = load("preparser.py")
+    assert parser.prog == "preparser"
+    assert option_strings(parser) == {"-h", "--help", "--config", "--real"}
+
+
+def test_parse_methods_are_restored():
+    parse_args = argparse.ArgumentParser.parse_args
+    load("plain.py")
+    assert argparse.ArgumentParser.parse_args is parse_args
+
+
+def test_module_parser_without_running_main():
+    parser = load("module_parser.py")
+    assert parser.prog == "module_parser"
+    assert option_strings(parser) == {"-h", "--help", "--base"}
+
+
+def test_module_parser_completed_in_main():
+    parser = load("module_parser_main.py")
+    assert option_strings(parser) == {"-h", "--help", "--base"}
+    assert subcommands(parser) == {"run"}
+
+
+def test_module_subparsers_completed_in_main():
+    assert subcommands(load("module_subparsers.py")) == {"run"}
+
+
+def test_module_subparsers_without_running_main():
+    assert subcommands(load("module_subparsers_static.py")) == {"run"}